@@ -5,65 +5,70 @@ Creates 500 properties with varied attributes for testing.
 """
 
 import json
-import random
+
+import numpy as np
 
 # Seed for reproducibility
-random.seed(42)
+RNG_SEED = 42
 
 PROPERTY_TYPES = ['kontor', 'butik', 'lager']
 CITIES = ['Stockholm', 'Göteborg', 'Malmö']
 
+# Realistic (min_sqm, max_sqm, min_price, max_price) per property type
+VALUE_RANGES = {
+    'kontor': (50, 500, 20000, 150000),
+    'butik': (30, 300, 15000, 120000),
+    'lager': (100, 2000, 10000, 100000),
+}
+
 
 def generate_synthetic_properties(count=500):
     """
     Generate synthetic properties.
-    
+
     Args:
         count: Number of properties to generate
-    
+
     Returns:
         list: List of property dictionaries
     """
+    # Draw each attribute as one bulk array instead of one
+    # random.choice/randint call per property.
+    rng = np.random.default_rng(RNG_SEED)
+    types = rng.choice(PROPERTY_TYPES, size=count)
+    cities = rng.choice(CITIES, size=count)
 
-    properties = []
-    
-    for i in range(1, count + 1):
-        property_type = random.choice(PROPERTY_TYPES)
-        city = random.choice(CITIES)
-        
-        # Generate realistic values based on property type
-        if property_type == 'kontor':
-            square_meters = random.randint(50, 500)
-            base_price = random.randint(20000, 150000)
-        elif property_type == 'butik':
-            square_meters = random.randint(30, 300)
-            base_price = random.randint(15000, 120000)
-        else:  # lager
-            square_meters = random.randint(100, 2000)
-            base_price = random.randint(10000, 100000)
-        
-        # Add some variation to the price
-        price = base_price + random.randint(-5000, 5000)
-        price = max(10000, price)  # Minimum 10000
-        
-        prop = {
-            'id': i,
-            'property_type': property_type,
-            'city': city,
-            'square_meters': square_meters,
-            'price_per_month': str(price),  # As string for realism
+    square_meters = np.empty(count, dtype=np.int64)
+    base_price = np.empty(count, dtype=np.int64)
+    for ptype, (min_sqm, max_sqm, min_price, max_price) in VALUE_RANGES.items():
+        mask = types == ptype
+        n = int(mask.sum())
+        square_meters[mask] = rng.integers(min_sqm, max_sqm + 1, size=n)
+        base_price[mask] = rng.integers(min_price, max_price + 1, size=n)
+
+    # Add some variation to the price, with a 10000 floor
+    price = base_price + rng.integers(-5000, 5001, size=count)
+    price = np.maximum(10000, price)
+
+    return [
+        {
+            'id': i + 1,
+            'property_type': str(types[i]),
+            'city': str(cities[i]),
+            'square_meters': int(square_meters[i]),
+            'price_per_month': str(int(price[i])),  # As string for realism
         }
-        
-        properties.append(prop)
-    
-    return properties
+        for i in range(count)
+    ]
 
 
 if __name__ == '__main__':
     properties = generate_synthetic_properties(500)
     
     with open('synthetic_properties.json', 'w', encoding='utf-8') as f:
-        json.dump(properties, f, indent=2, ensure_ascii=False)
+        # Serialize first and write once: json.dump issues one small
+        # write per token, which dominates the output step.
+        f.write(json.dumps(properties, indent=2, ensure_ascii=False))
     
     print(f"Generated {len(properties)} synthetic properties")
     print(f"Saved to synthetic_properties.json")
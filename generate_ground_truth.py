@@ -2,7 +2,13 @@
 Generate ground truth matches for each profile based on independent criteria.
 """
 
-import json
+import sys
+
+import numpy as np
+
+from matching.jsonio import load_json, dump_json
+from matching.scoring import prepare_properties
+from matching.scoring_vec import build_property_arrays
 
 DATA_DIR = "data"
 PROFILES_FILE = f"{DATA_DIR}/ground_truth_profiles.json"
@@ -15,88 +21,104 @@ SIZE_BONUS_TIER1 = 0.10  # Within 10% = best size match
 SIZE_BONUS_TIER2 = 0.20  # Within 20% = good size match
 NUM_MATCHES_PER_PROFILE = 5
 
+# Per-profile match details are only printed with -v/--verbose; the
+# formatting and stdout writes are pure overhead otherwise.
+VERBOSE = "-v" in sys.argv or "--verbose" in sys.argv
+
 
 def load_profiles():
-  with open(PROFILES_FILE, "r", encoding="utf-8") as f:
-    data = json.load(f)
-    return data.get("profiles", [])
+  return load_json(PROFILES_FILE).get("profiles", [])
 
 
 def load_properties():
-  with open(PROPERTIES_FILE, "r", encoding="utf-8") as f:
-    return json.load(f)
+  return prepare_properties(load_json(PROPERTIES_FILE))
 
 
-def find_good_matches(profile, properties, num_matches=NUM_MATCHES_PER_PROFILE):
+def _string_code(values, desired):
+  """
+  Code for a desired type/city in a PropertyArrays vocabulary.
+
+  Returns the int code whose rows match the desired value exactly:
+  -1 (the missing-field code) when desired is empty, None when the
+  value does not occur in the data at all.
+  """
+  if not desired:
+      return -1
+  if desired in values:
+      return values.index(desired)
+  return None
+
+
+def find_good_matches(profile, arrays, num_matches=NUM_MATCHES_PER_PROFILE):
   """
   Criteria:
   1. Property type must match exactly
   2. City must match exactly
   3. Price must be within budget (or slightly over)
   4. Size should be close to desired size
+
+  Operates on the PropertyArrays struct-of-arrays view shared with
+  matching.scoring_vec: all filters and scores are computed as masked
+  array operations instead of a Python loop over properties.
   """
   profile_data = profile["profile"]
-  matches = []
 
   desired_type = profile_data.get("property_type", "").lower()
   desired_city = profile_data.get("city", "").lower()
   desired_size = profile_data.get("square_meters", 0)
   max_price = profile_data.get("max_price", 0)
 
-  for prop in properties:
-      if prop.get("property_type", "").lower() != desired_type:
-          continue
-
-      if prop.get("city", "").lower() != desired_city:
-          continue
-
-      try:
-          price_str = (
-              str(prop.get("price_per_month", "0")).replace(" ", "").replace(",", "")
-          )
-          price = int(price_str)
-          if max_price > 0 and price > max_price * MAX_PRICE_TOLERANCE:
-              continue
-      except (ValueError, TypeError):
-          continue
-
-      prop_size = prop.get("square_meters", 0)
-      size_diff = abs(prop_size - desired_size) if desired_size > 0 else 0
-      size_diff_ratio = size_diff / desired_size if desired_size > 0 else 0
-
-      if desired_size > 0 and size_diff_ratio > MAX_SIZE_DEVIATION:
-          continue
-
-      score = 0
-
-      if price <= max_price:
-          score += 100 + (max_price - price) / max(max_price, 1) * 50
-      else:
-          score += 50 - (price - max_price) / max(max_price, 1) * 50
-
-      if desired_size > 0:
-          if size_diff_ratio <= SIZE_BONUS_TIER1:
-              score += 100
-          elif size_diff_ratio <= SIZE_BONUS_TIER2:
-              score += 70
-          else:
-              score += 40 * (1 - size_diff_ratio)
-
-      matches.append(
-          {
-              "property_id": prop["id"],
-              "score": score,
-              "price": price,
-              "size": prop_size,
-              "size_diff": size_diff,
-          }
+  type_code = _string_code(arrays.ptype_values, desired_type)
+  city_code = _string_code(arrays.city_values, desired_city)
+  if type_code is None or city_code is None:
+      return []
+
+  # Criteria 1-3 as one candidate mask (price -1 means unparseable)
+  mask = (
+      (arrays.ptype_id == type_code)
+      & (arrays.city_id == city_code)
+      & (arrays.price >= 0)
+  )
+  if max_price > 0:
+      mask &= arrays.price <= max_price * MAX_PRICE_TOLERANCE
+
+  prices = arrays.price[mask]
+  sizes = arrays.size[mask]
+  ids = arrays.ids[mask]
+
+  if desired_size > 0:
+      size_diff = np.abs(sizes - desired_size)
+      size_diff_ratio = size_diff / desired_size
+      keep = size_diff_ratio <= MAX_SIZE_DEVIATION
+      prices, sizes, ids = prices[keep], sizes[keep], ids[keep]
+      size_diff, size_diff_ratio = size_diff[keep], size_diff_ratio[keep]
+  else:
+      size_diff = np.zeros(len(ids), dtype=np.int64)
+      size_diff_ratio = np.zeros(len(ids))
+
+  scores = np.where(
+      prices <= max_price,
+      100 + (max_price - prices) / max(max_price, 1) * 50,
+      50 - (prices - max_price) / max(max_price, 1) * 50,
+  )
+  if desired_size > 0:
+      scores += np.where(
+          size_diff_ratio <= SIZE_BONUS_TIER1,
+          100,
+          np.where(
+              size_diff_ratio <= SIZE_BONUS_TIER2,
+              70,
+              40 * (1 - size_diff_ratio),
+          ),
       )
 
-  matches.sort(key=lambda x: (-x["score"], x["size_diff"], x["price"]))
+  # Rank by score desc, then smaller size gap, then lower price;
+  # lexsort is stable so remaining ties keep property order.
+  order = np.lexsort((prices, size_diff, -scores))[:num_matches]
 
   return [
-    {"property_id": m["property_id"], "rank": rank}
-    for rank, m in enumerate(matches[:num_matches], start=1)
+    {"property_id": int(ids[i]), "rank": rank}
+    for rank, i in enumerate(order, start=1)
   ]
 
 
@@ -106,34 +128,36 @@ def main():
     profiles = load_profiles()
     properties = load_properties()
     props_by_id = {p["id"]: p for p in properties}
+    arrays = build_property_arrays(properties)
 
     ground_truth = {}
 
     for profile in profiles:
         profile_id = profile["profile_id"]
-        print(f"\nProcessing {profile_id}...")
-        print(f"  Looking for: {profile['profile']}")
+        if VERBOSE:
+            print(f"\nProcessing {profile_id}...")
+            print(f"  Looking for: {profile['profile']}")
 
-        matches = find_good_matches(profile, properties)
+        matches = find_good_matches(profile, arrays)
 
         if matches:
             ground_truth[profile_id] = matches
-            print(f"  Found {len(matches)} good matches:")
-            for match in matches:
-                prop = props_by_id.get(match["property_id"])
-                if prop:
-                    print(
-                        f"    Rank {match['rank']}: Property {prop['id']} - "
-                        f"{prop['property_type']}, {prop['city']}, "
-                        f"{prop['square_meters']}m², {prop['price_per_month']}kr"
-                    )
+            if VERBOSE:
+                print(f"  Found {len(matches)} good matches:")
+                for match in matches:
+                    prop = props_by_id.get(match["property_id"])
+                    if prop:
+                        print(
+                            f"    Rank {match['rank']}: Property {prop['id']} - "
+                            f"{prop['property_type']}, {prop['city']}, "
+                            f"{prop['square_meters']}m², {prop['price_per_month']}kr"
+                        )
         else:
             print(f"  WARNING: No matches found for {profile_id}")
 
     output = {"ground_truth": ground_truth}
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    dump_json(output, OUTPUT_FILE)
 
     print(f"\n✓ Ground truth saved to {OUTPUT_FILE}")
     print(f"  Total profiles with matches: {len(ground_truth)}")
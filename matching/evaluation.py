@@ -7,6 +7,60 @@ evaluating ranking algorithms. It takes into account both relevance and position
 
 import numpy as np
 
+# Position discounts 1/log2(position + 2) for 0-indexed positions.
+# Precomputed once so the DCG loops avoid a np.log2 call per position;
+# 1024 positions is far more than any realistic k.
+_DISCOUNTS = 1.0 / np.log2(np.arange(2, 1026, dtype=np.float64))
+
+
+def prepare_ndcg_context(ideal_ranks, k=10):
+    """
+    Precompute the parts of NDCG@k that depend only on ideal_ranks.
+
+    Builds a dense relevance table indexed by property id (ids are
+    assumed to be small non-negative ints) and the IDCG normalizer.
+    Ground truth is static across repeated evaluations, so callers that
+    score many predicted rankings against the same ideal ranking should
+    build this once and use calculate_ndcg_with_context.
+
+    Returns:
+        (rel_arr, idcg) tuple, or None if ideal_ranks is empty.
+    """
+    if not ideal_ranks:
+        return None
+
+    n = len(ideal_ranks)
+    relevance = {prop_id: n - i for i, prop_id in enumerate(ideal_ranks)}
+
+    rel_arr = np.zeros(max(relevance) + 1, dtype=np.float64)
+    for prop_id, rel in relevance.items():
+        rel_arr[prop_id] = rel
+
+    sorted_relevance = np.sort(
+        np.fromiter(relevance.values(), dtype=np.float64, count=len(relevance))
+    )[::-1][:k]
+    idcg = float(np.dot(sorted_relevance, _DISCOUNTS[:sorted_relevance.size]))
+    return rel_arr, idcg
+
+
+def calculate_ndcg_with_context(predicted_ranks, context, k=10):
+    """
+    NDCG@k for a predicted ranking against a prepare_ndcg_context tuple.
+
+    Equivalent to calculate_ndcg_at_k, but the relevance lookup is a
+    single array gather and IDCG is already computed.
+    """
+    if context is None:
+        return 0.0
+    rel_arr, idcg = context
+    if idcg == 0:
+        return 0.0
+
+    predicted = np.asarray(predicted_ranks[:k], dtype=np.int64)
+    in_table = predicted < len(rel_arr)
+    rels = np.where(in_table, rel_arr[np.where(in_table, predicted, 0)], 0.0)
+    return float(np.dot(rels, _DISCOUNTS[:rels.size])) / idcg
+
 
 def calculate_ndcg_at_k(predicted_ranks, ideal_ranks, k=10):
     """
@@ -38,20 +92,23 @@ def calculate_ndcg_at_k(predicted_ranks, ideal_ranks, k=10):
     for i, prop_id in enumerate(ideal_ranks):
         relevance[prop_id] = len(ideal_ranks) - i  # Rank 1 = len(ideal), Rank 2 = len(ideal)-1, etc.
     
-    # Calculate DCG (Discounted Cumulative Gain) for predicted ranking
-    dcg = 0.0
-    for i, prop_id in enumerate(predicted_ranks[:k]):
-        rel = relevance.get(prop_id, 0)  # Relevance for this property (0 if not in ideal_ranks)
-        # Discounted gain: relevance / log2(position + 1)
-        # +1 because position is 0-indexed, +1 more to avoid log2(1) = 0
-        dcg += rel / np.log2(i + 2)
-    
-    # Calculate IDCG (Ideal DCG) - what DCG would be if ranking was perfect
-    idcg = 0.0
-    # Sort relevance values in descending order (highest first)
-    sorted_relevance = sorted(relevance.values(), reverse=True)
-    for i, rel in enumerate(sorted_relevance[:k]):
-        idcg += rel / np.log2(i + 2)
+    # Calculate DCG (Discounted Cumulative Gain) for predicted ranking:
+    # gather the relevance of each predicted property (0 if not in
+    # ideal_ranks) and dot it with the precomputed position discounts.
+    predicted = predicted_ranks[:k]
+    rels = np.fromiter(
+        (relevance.get(prop_id, 0) for prop_id in predicted),
+        dtype=np.float64,
+        count=len(predicted),
+    )
+    dcg = float(np.dot(rels, _DISCOUNTS[:rels.size]))
+
+    # Calculate IDCG (Ideal DCG) - what DCG would be if ranking was perfect:
+    # relevance values sorted in descending order (highest first)
+    sorted_relevance = np.sort(
+        np.fromiter(relevance.values(), dtype=np.float64, count=len(relevance))
+    )[::-1][:k]
+    idcg = float(np.dot(sorted_relevance, _DISCOUNTS[:sorted_relevance.size]))
     
     # Normalize: DCG / IDCG
     if idcg == 0:
@@ -0,0 +1,40 @@
+"""
+JSON file helpers with an optional orjson fast path.
+
+orjson parses and serializes JSON several times faster than the stdlib
+module, which matters because the data files are re-read by evaluation
+runs. It is an optional dependency: when it is not installed these
+helpers fall back to the stdlib json module with identical results.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path):
+    """Load a JSON file from path."""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_json(obj, path, indent=2):
+    """
+    Write obj to path as JSON in a single write call.
+
+    Uses 2-space indentation and keeps non-ASCII characters unescaped,
+    matching the json.dump(..., indent=2, ensure_ascii=False) calls
+    this replaces.
+    """
+    if orjson is not None and indent == 2:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(obj, indent=indent, ensure_ascii=False))
@@ -5,10 +5,58 @@ This algorithm is a simplified version of MyPortal's matching algorithm.
 It uses 4 weights to calculate a total score for each property.
 """
 
+import heapq
+from collections import namedtuple
+
 from matching.weights import BASE_WEIGHTS
 
+# Profile fields the scorer reads, normalized once per profile instead
+# of once per score_property call. Empty strings / missing values are
+# stored as '' and 0 so the scorer can test truthiness directly.
+ProfileSpec = namedtuple('ProfileSpec', ['ptype', 'city', 'target_size', 'max_price'])
+
+
+def precompile_profile(profile):
+    """
+    Normalize a profile dict into a ProfileSpec.
+
+    score_property re-reads and lowercases the same profile fields for
+    every property it scores. When scoring many properties against one
+    profile, build the spec once and call score_property_compiled.
+    """
+    return ProfileSpec(
+        (profile.get('property_type') or '').lower(),
+        (profile.get('city') or '').lower(),
+        profile.get('square_meters') or 0,
+        profile.get('max_price') or 0,
+    )
+
+
+def prepare_properties(properties):
+    """
+    Cache derived fields on each property dict, in place.
+
+    Adds:
+        '_ptype': lowercased property_type
+        '_city': lowercased city
+        '_price_int': price_per_month parsed to int (None if unparseable)
 
-def score_property(property_obj, profile):
+    These fields are immutable per property but get recomputed on every
+    score_property call otherwise, so loaders should call this once
+    right after reading the JSON.
+
+    Returns the same list for convenience.
+    """
+    for prop in properties:
+        prop['_ptype'] = (prop.get('property_type') or '').lower()
+        prop['_city'] = (prop.get('city') or '').lower()
+        raw_price = prop.get('price_per_month')
+        price_str = str(raw_price).replace(' ', '').replace(',', '') if raw_price else ''
+        prop['_price_int'] = int(price_str) if price_str.isdigit() else None
+    return properties
+
+
+def score_property(property_obj, profile, weights=BASE_WEIGHTS):
     """
     Score a property against a profile.
     
@@ -29,53 +77,105 @@ def score_property(property_obj, profile):
     Returns:
         float: Total score (higher = better match)
     """
+    return score_property_compiled(property_obj, precompile_profile(profile), weights)
+
+
+def score_property_compiled(property_obj, spec, weights=BASE_WEIGHTS):
+    """
+    Score a property against a precompiled ProfileSpec.
+
+    Same scoring as score_property, but takes the normalized spec from
+    precompile_profile so the per-profile work is not repeated for
+    every property.
+    """
     score = 0.0
-    
+
+    # One dict lookup per weight instead of one per scoring term.
+    w_type = weights['property_type']
+    w_location = weights['location']
+    w_size = weights['size']
+    w_price = weights['price']
+
+    # Cached lowercase fields from prepare_properties; fall back to
+    # lowercasing on the fly for raw dicts.
+    prop_type = property_obj.get('_ptype')
+    if prop_type is None:
+        prop_type = (property_obj.get('property_type') or '').lower()
+    prop_city = property_obj.get('_city')
+    if prop_city is None:
+        prop_city = (property_obj.get('city') or '').lower()
+
     # 1. Property type match (binary: matches or doesn't match)
-    if profile.get('property_type') and property_obj.get('property_type'):
-        if profile['property_type'].lower() == property_obj['property_type'].lower():
-            score += BASE_WEIGHTS['property_type']
-    
+    if spec.ptype and prop_type:
+        if spec.ptype == prop_type:
+            score += w_type
+
     # 2. Location match (binary: matches city or doesn't match)
-    if profile.get('city') and property_obj.get('city'):
-        if profile['city'].lower() in property_obj['city'].lower():
-            score += BASE_WEIGHTS['location']
-    
+    if spec.city and prop_city:
+        if spec.city in prop_city:
+            score += w_location
+
     # 3. Size match (continuous: closer to desired size = higher score)
-    if profile.get('square_meters') and property_obj.get('square_meters'):
-        target = profile['square_meters']
+    if spec.target_size and property_obj.get('square_meters'):
+        target = spec.target_size
         actual = property_obj['square_meters']
-        
+
         if target > 0:
             diff_ratio = abs(actual - target) / target
-            
+
             if diff_ratio <= 0.15:  # Within 15% = full score
-                score += BASE_WEIGHTS['size'] * (1 - diff_ratio / 0.15)
+                score += w_size * (1 - diff_ratio / 0.15)
             elif diff_ratio <= 0.30:  # Within 30% = half score
-                score += BASE_WEIGHTS['size'] * 0.5 * (1 - (diff_ratio - 0.15) / 0.15)
+                score += w_size * 0.5 * (1 - (diff_ratio - 0.15) / 0.15)
             # Outside 30% = 0 points
-    
+
     # 4. Price match (continuous: under budget = positive, over = negative)
-    if profile.get('max_price') and property_obj.get('price_per_month'):
-        try:
-            # Convert price_per_month to int (handle str with spaces/commas)
-            price_str = str(property_obj['price_per_month']).replace(' ', '').replace(',', '')
-            price = int(price_str)
-            max_price = profile['max_price']
-            
-            if price <= max_price:
-                # Within budget: full score
-                score += BASE_WEIGHTS['price']
+    price = property_obj.get('_price_int')
+    if price is None:
+        # Raw dict without cached fields: same lenient parse as
+        # prepare_properties, no exception machinery in the loop
+        raw_price = property_obj.get('price_per_month')
+        if raw_price:
+            price_str = str(raw_price).replace(' ', '').replace(',', '')
+            if price_str.isdigit():
+                price = int(price_str)
+    if spec.max_price and price is not None:
+        max_price = spec.max_price
+
+        if price <= max_price:
+            # Within budget: full score
+            score += w_price
+        else:
+            # Over budget: penalty
+            over_ratio = (price - max_price) / max_price
+            if over_ratio <= 0.05:  # Slightly over (5%)
+                score += w_price * 0.5
             else:
-                # Over budget: penalty
-                over_ratio = (price - max_price) / max_price
-                if over_ratio <= 0.05:  # Slightly over (5%)
-                    score += BASE_WEIGHTS['price'] * 0.5
-                else:
-                    # Far over: negative penalty (can make total score negative)
-                    score -= BASE_WEIGHTS['price'] * (1 + over_ratio)
-        except (ValueError, TypeError):
-            # If price cannot be converted, skip
-            pass
-    
+                # Far over: negative penalty (can make total score negative)
+                score -= w_price * (1 + over_ratio)
+
     return score
+
+
+def top_matches(properties, profile, k=10, weights=BASE_WEIGHTS):
+    """
+    Return the ids of the k best-scoring properties for a profile.
+
+    Scalar counterpart of the vectorized top-k selection in the test
+    environment: scoring and selection are fused by maintaining a
+    size-k heap while iterating, so the full score list is never
+    materialized or sorted. Ties are broken by list position, matching
+    a stable descending sort of all scores.
+    """
+    spec = precompile_profile(profile)
+    heap = []
+    for index, prop in enumerate(properties):
+        # -index makes earlier properties win score ties, like a
+        # stable sort would.
+        entry = (score_property_compiled(prop, spec, weights), -index, prop['id'])
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heappushpop(heap, entry)
+    heap.sort(reverse=True)
+    return [prop_id for _, _, prop_id in heap]
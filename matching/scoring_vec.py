@@ -0,0 +1,326 @@
+"""
+Vectorized scoring of all properties at once using NumPy.
+
+This mirrors matching.scoring.score_property exactly, but stores the
+property list column-wise (structure of arrays) and computes the score
+for every property in a handful of array operations instead of one
+Python call per property. evaluate_weights-style loops over hundreds of
+properties per profile become a single score_all call.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from matching.weights import BASE_WEIGHTS
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+@dataclass
+class PropertyArrays:
+    """
+    Column-wise (struct-of-arrays) view of a property list.
+
+    Type and city strings are dictionary-encoded: the arrays hold small
+    integer codes and the distinct lowercased values live in
+    ptype_values / city_values. -1 marks a missing string field and a
+    missing/unparseable price; 0 marks a missing size.
+    """
+    ids: np.ndarray       # int32[N] property ids
+    ptype_id: np.ndarray  # int8[N] index into ptype_values
+    city_id: np.ndarray   # int8[N] index into city_values
+    size: np.ndarray      # int32[N] square meters
+    price: np.ndarray     # int32[N] parsed monthly price
+    ptype_values: tuple   # distinct lowercased property types
+    city_values: tuple    # distinct lowercased cities
+
+
+def _encode(values):
+    """Map a list of strings to int8 codes plus the distinct values."""
+    codes = {}
+    encoded = np.empty(len(values), dtype=np.int8)
+    for i, value in enumerate(values):
+        if not value:
+            encoded[i] = -1
+        else:
+            encoded[i] = codes.setdefault(value, len(codes))
+    return encoded, tuple(codes)
+
+
+def build_property_arrays(properties):
+    """
+    Build PropertyArrays from a list of property dicts.
+
+    Uses the _ptype/_city/_price_int fields cached by
+    matching.scoring.prepare_properties when present, falling back to
+    the raw fields otherwise. Build this once per property list and
+    reuse it across profiles and weight evaluations.
+    """
+    n = len(properties)
+    ids = np.empty(n, dtype=np.int32)
+    size = np.empty(n, dtype=np.int32)
+    price = np.empty(n, dtype=np.int32)
+    ptypes = []
+    cities = []
+
+    for i, prop in enumerate(properties):
+        ids[i] = prop.get('id', -1)
+        size[i] = prop.get('square_meters') or 0
+
+        price_int = prop.get('_price_int')
+        if price_int is None and prop.get('price_per_month'):
+            price_str = str(prop['price_per_month']).replace(' ', '').replace(',', '')
+            price_int = int(price_str) if price_str.isdigit() else None
+        price[i] = -1 if price_int is None else price_int
+
+        ptype = prop.get('_ptype')
+        if ptype is None:
+            ptype = (prop.get('property_type') or '').lower()
+        ptypes.append(ptype)
+
+        city = prop.get('_city')
+        if city is None:
+            city = (prop.get('city') or '').lower()
+        cities.append(city)
+
+    ptype_id, ptype_values = _encode(ptypes)
+    city_id, city_values = _encode(cities)
+    return PropertyArrays(ids, ptype_id, city_id, size, price,
+                          ptype_values, city_values)
+
+
+def _type_mask(arrays, profile):
+    """Boolean mask of properties whose type matches the profile exactly."""
+    desired_type = (profile.get('property_type') or '').lower()
+    if desired_type and desired_type in arrays.ptype_values:
+        return arrays.ptype_id == arrays.ptype_values.index(desired_type)
+    return np.zeros(len(arrays.ids), dtype=bool)
+
+
+def _city_mask(arrays, profile):
+    """Boolean mask of properties whose city contains the profile city."""
+    desired_city = (profile.get('city') or '').lower()
+    if desired_city:
+        city_codes = [code for code, value in enumerate(arrays.city_values)
+                      if desired_city in value]
+        if city_codes:
+            return np.isin(arrays.city_id, city_codes)
+    return np.zeros(len(arrays.ids), dtype=bool)
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _score_kernel(type_ok, city_ok, size, price, target, use_price,
+                      max_price, w_type, w_location, w_size, w_price, out):
+        # Fused per-property scoring: one pass, no NumPy temporaries.
+        # fastmath stays off so the arithmetic (and therefore the
+        # ranking) is bit-identical to the NumPy and scalar paths.
+        for i in range(size.shape[0]):
+            score = 0.0
+            if type_ok[i]:
+                score += w_type
+            if city_ok[i]:
+                score += w_location
+            if target > 0:
+                diff_ratio = abs(size[i] - target) / target
+                if diff_ratio <= 0.15:
+                    score += w_size * (1 - diff_ratio / 0.15)
+                elif diff_ratio <= 0.30:
+                    score += w_size * 0.5 * (1 - (diff_ratio - 0.15) / 0.15)
+            if use_price and price[i] >= 0:
+                if price[i] <= max_price:
+                    score += w_price
+                else:
+                    over_ratio = (price[i] - max_price) / max_price
+                    if over_ratio <= 0.05:
+                        score += w_price * 0.5
+                    else:
+                        score -= w_price * (1 + over_ratio)
+            out[i] = score
+    @numba.njit(cache=True)
+    def _select_top_k(scores, k):
+        # Partial selection: indices of the k highest scores, ordered
+        # by score descending with ties kept in index order, matching
+        # a stable descending sort. O(N*k) worst case, but the sorted
+        # prefix rarely shifts once it fills up.
+        n = scores.shape[0]
+        if k > n:
+            k = n
+        top_idx = np.empty(k, dtype=np.int64)
+        count = 0
+        for i in range(n):
+            s = scores[i]
+            if count < k:
+                pos = count
+                count += 1
+            elif s > scores[top_idx[k - 1]]:
+                pos = k - 1
+            else:
+                continue
+            while pos > 0 and scores[top_idx[pos - 1]] < s:
+                top_idx[pos] = top_idx[pos - 1]
+                pos -= 1
+            top_idx[pos] = i
+        return top_idx
+else:
+    _score_kernel = None
+    _select_top_k = None
+
+
+def rank_top_k(scores, ids, k):
+    """
+    Ids of the k highest scores, best first.
+
+    Ties resolve by array position, exactly like taking the first k
+    entries of a stable descending sort. Uses the compiled partial
+    selection when numba is available; otherwise argpartition plus a
+    tie-aware re-sort around the k-th score.
+    """
+    if _select_top_k is not None:
+        return ids[_select_top_k(scores, k)]
+
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+        threshold = scores[top].min()
+        candidates = np.flatnonzero(scores >= threshold)
+        order = np.argsort(-scores[candidates], kind="stable")
+        top = candidates[order[:k]]
+    else:
+        top = np.argsort(-scores, kind="stable")
+    return ids[top]
+
+
+def score_all(arrays, profile, weights=BASE_WEIGHTS):
+    """
+    Score every property in arrays against a profile.
+
+    Implements the same four terms as score_property (type, location,
+    size, price) with identical tier boundaries and weights. When numba
+    is installed the whole computation runs as one fused compiled loop;
+    otherwise it falls back to NumPy array ops with the same results.
+
+    Returns:
+        float64 array of scores, aligned with arrays.ids.
+    """
+    return _score_with_scalars(
+        arrays, profile,
+        float(weights['property_type']), float(weights['location']),
+        float(weights['size']), float(weights['price']),
+    )
+
+
+def specialize_scorer(weights):
+    """
+    Bind a weight dict into a scorer(arrays, profile) function.
+
+    During one evaluation pass (and one optimizer candidate) the
+    weights are fixed while many profiles are scored, so the dict
+    lookups and float conversions are hoisted out here instead of
+    being repeated in every score_all call.
+    """
+    w_type = float(weights['property_type'])
+    w_location = float(weights['location'])
+    w_size = float(weights['size'])
+    w_price = float(weights['price'])
+
+    def scorer(arrays, profile):
+        return _score_with_scalars(arrays, profile,
+                                   w_type, w_location, w_size, w_price)
+
+    return scorer
+
+
+def _score_with_scalars(arrays, profile, w_type, w_location, w_size, w_price):
+    """score_all with the four weights already unpacked to floats."""
+    type_ok = _type_mask(arrays, profile)
+    city_ok = _city_mask(arrays, profile)
+
+    raw_target = profile.get('square_meters')
+    target = raw_target if raw_target and raw_target > 0 else 0
+    max_price = profile.get('max_price')
+
+    if _score_kernel is not None:
+        out = np.empty(len(arrays.ids), dtype=np.float64)
+        _score_kernel(
+            type_ok, city_ok, arrays.size, arrays.price,
+            float(target), bool(max_price), float(max_price or 0),
+            w_type, w_location, w_size, w_price, out,
+        )
+        return out
+
+    scores = np.zeros(len(arrays.ids), dtype=np.float64)
+
+    # 1. Property type match (exact, binary)
+    scores += w_type * type_ok
+
+    # 2. Location match (profile city contained in property city, binary)
+    scores += w_location * city_ok
+
+    # 3. Size match (tiered: <=15% full score, <=30% half score).
+    # Expressed as two clipped ramps instead of nested np.where. The
+    # tiers are discontinuous at 15% (the score jumps from 0 back up to
+    # half weight), so the second ramp carries an explicit >15% mask
+    # rather than folding into a single piecewise-linear clip.
+    if target > 0:
+        diff_ratio = np.abs(arrays.size - target) / target
+        ramp1 = np.clip(1 - diff_ratio / 0.15, 0.0, 1.0)
+        ramp2 = np.clip(1 - (diff_ratio - 0.15) / 0.15, 0.0, 1.0)
+        scores += w_size * (ramp1 + 0.5 * ramp2 * (diff_ratio > 0.15))
+
+    # 4. Price match (within budget full score, tiered penalty over)
+    if max_price:
+        over_ratio = (arrays.price - max_price) / max_price
+        price_score = np.where(
+            arrays.price <= max_price,
+            w_price,
+            np.where(
+                over_ratio <= 0.05,
+                w_price * 0.5,
+                -w_price * (1 + over_ratio),
+            ),
+        )
+        scores += np.where(arrays.price >= 0, price_score, 0.0)
+
+    return scores
+
+
+def profile_contributions(arrays, profile):
+    """
+    Unweighted contribution of each scoring term, per property.
+
+    Returns an (N, 4) float64 matrix whose columns multiply the
+    property_type, location, size and price weights respectively; the
+    score is linear in the weights, so
+
+        score_all(arrays, profile, w) == contributions @ (wt, wl, ws, wp)
+
+    This lets a whole batch of candidate weight vectors be scored with
+    one matrix product per profile.
+    """
+    contribs = np.zeros((len(arrays.ids), 4), dtype=np.float64)
+    contribs[:, 0] = _type_mask(arrays, profile)
+    contribs[:, 1] = _city_mask(arrays, profile)
+
+    raw_target = profile.get('square_meters')
+    target = raw_target if raw_target and raw_target > 0 else 0
+    if target > 0:
+        diff_ratio = np.abs(arrays.size - target) / target
+        ramp1 = np.clip(1 - diff_ratio / 0.15, 0.0, 1.0)
+        ramp2 = np.clip(1 - (diff_ratio - 0.15) / 0.15, 0.0, 1.0)
+        contribs[:, 2] = ramp1 + 0.5 * ramp2 * (diff_ratio > 0.15)
+
+    max_price = profile.get('max_price')
+    if max_price:
+        over_ratio = (arrays.price - max_price) / max_price
+        price_contrib = np.where(
+            arrays.price <= max_price,
+            1.0,
+            np.where(over_ratio <= 0.05, 0.5, -(1 + over_ratio)),
+        )
+        contribs[:, 3] = np.where(arrays.price >= 0, price_contrib, 0.0)
+
+    return contribs